@@ -0,0 +1,224 @@
+/*
+ * Native compression stage for zip_chunker.py.
+ *
+ * Each thread owns a libdeflate compressor and an output arena, pulls file
+ * indices off a shared counter, maps the file, and appends its CRC-checked
+ * raw DEFLATE stream (or the raw bytes, when deflate would not shrink them)
+ * to its arena. Python only sees the entry table and the arenas.
+ *
+ * Build with chunker_native_build.py. Keep -O2: higher levels have been seen
+ * to regress deflate's hot loops.
+ */
+#include "chunker_native.h"
+
+#include <errno.h>
+#include <fcntl.h>
+#include <pthread.h>
+#include <stdatomic.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+
+#include <libdeflate.h>
+
+/* Mirrors MIN_DEFLATE_SIZE in zip_chunker.py: smaller inputs only grow. */
+#define MIN_DEFLATE_SIZE 64
+
+struct batch {
+    const char *const *paths;
+    size_t n_paths;
+    const unsigned char *store;
+    int level;
+    struct chunker_entry *entries;
+    atomic_size_t next;
+};
+
+struct worker {
+    struct batch *batch;
+    struct chunker_arena *arena;
+    int index;
+};
+
+static int arena_reserve(struct chunker_arena *arena, size_t extra)
+{
+    size_t needed = arena->size + extra;
+    size_t capacity;
+    char *data;
+
+    if (needed < arena->size)
+        return ENOMEM;
+    if (needed <= arena->capacity)
+        return 0;
+
+    capacity = arena->capacity ? arena->capacity : (size_t)1 << 20;
+    while (capacity < needed) {
+        if (capacity > SIZE_MAX / 2) {
+            capacity = needed;
+            break;
+        }
+        capacity *= 2;
+    }
+    data = realloc(arena->data, capacity);
+    if (!data)
+        return ENOMEM;
+    arena->data = data;
+    arena->capacity = capacity;
+    return 0;
+}
+
+static int store_raw(struct chunker_arena *arena, const void *buf, size_t size,
+                     struct chunker_entry *entry)
+{
+    int err = arena_reserve(arena, size);
+
+    if (err)
+        return err;
+    if (size)
+        memcpy(arena->data + arena->size, buf, size);
+    entry->offset = arena->size;
+    entry->compressed_size = size;
+    entry->stored = 1;
+    arena->size += size;
+    return 0;
+}
+
+static int compress_file(struct libdeflate_compressor *compressor,
+                         struct chunker_arena *arena, const char *path,
+                         int store, struct chunker_entry *entry)
+{
+    struct stat st;
+    void *buf = NULL;
+    size_t size, bound, written;
+    int fd, err = 0;
+
+    fd = open(path, O_RDONLY | O_CLOEXEC);
+    if (fd < 0)
+        return errno;
+    if (fstat(fd, &st) < 0) {
+        err = errno;
+        goto out_close;
+    }
+    size = (size_t)st.st_size;
+
+    if (size) {
+        buf = mmap(NULL, size, PROT_READ, MAP_PRIVATE, fd, 0);
+        if (buf == MAP_FAILED) {
+            err = errno;
+            goto out_close;
+        }
+        madvise(buf, size, MADV_SEQUENTIAL);
+    }
+
+    entry->file_size = size;
+    entry->mtime = (int64_t)st.st_mtime;
+    entry->mode = (uint32_t)st.st_mode;
+    entry->crc = libdeflate_crc32(0, buf, size);
+
+    if (store || size < MIN_DEFLATE_SIZE) {
+        err = store_raw(arena, buf, size, entry);
+        goto out_unmap;
+    }
+
+    bound = libdeflate_deflate_compress_bound(compressor, size);
+    err = arena_reserve(arena, bound);
+    if (err)
+        goto out_unmap;
+    written = libdeflate_deflate_compress(compressor, buf, size,
+                                          arena->data + arena->size, bound);
+    if (written == 0 || written >= size) {
+        err = store_raw(arena, buf, size, entry);
+        goto out_unmap;
+    }
+    entry->offset = arena->size;
+    entry->compressed_size = written;
+    entry->stored = 0;
+    arena->size += written;
+
+out_unmap:
+    if (buf)
+        munmap(buf, size);
+out_close:
+    close(fd);
+    return err;
+}
+
+static void *worker_main(void *arg)
+{
+    struct worker *worker = arg;
+    struct batch *batch = worker->batch;
+    struct libdeflate_compressor *compressor;
+    size_t i;
+
+    compressor = libdeflate_alloc_compressor(batch->level);
+
+    while ((i = atomic_fetch_add(&batch->next, 1)) < batch->n_paths) {
+        struct chunker_entry *entry = &batch->entries[i];
+
+        memset(entry, 0, sizeof(*entry));
+        entry->arena = worker->index;
+        if (!compressor)
+            entry->error = ENOMEM;
+        else
+            entry->error = compress_file(compressor, worker->arena,
+                                         batch->paths[i], batch->store[i], entry);
+    }
+
+    libdeflate_free_compressor(compressor);
+    return NULL;
+}
+
+int chunker_compress_batch(const char *const *paths, size_t n_paths,
+                           const unsigned char *store, int level, int n_threads,
+                           struct chunker_entry *entries,
+                           struct chunker_arena *arenas)
+{
+    struct batch batch = {
+        .paths = paths,
+        .n_paths = n_paths,
+        .store = store,
+        .level = level,
+        .entries = entries,
+    };
+    struct worker *workers;
+    pthread_t *threads;
+    int started = 0, err = 0, t;
+
+    if (n_threads < 1)
+        return EINVAL;
+    atomic_init(&batch.next, 0);
+
+    workers = calloc((size_t)n_threads, sizeof(*workers));
+    threads = calloc((size_t)n_threads, sizeof(*threads));
+    if (!workers || !threads) {
+        err = ENOMEM;
+        goto out;
+    }
+
+    for (t = 0; t < n_threads; t++) {
+        workers[t].batch = &batch;
+        workers[t].arena = &arenas[t];
+        workers[t].index = t;
+        if (pthread_create(&threads[t], NULL, worker_main, &workers[t])) {
+            /* Fewer threads than asked for is fine; none at all is not. */
+            break;
+        }
+        started++;
+    }
+    if (!started)
+        err = EAGAIN;
+
+    for (t = 0; t < started; t++)
+        pthread_join(threads[t], NULL);
+
+out:
+    free(threads);
+    free(workers);
+    return err;
+}
+
+void chunker_free(void *ptr)
+{
+    free(ptr);
+}
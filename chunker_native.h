@@ -0,0 +1,41 @@
+#ifndef CHUNKER_NATIVE_H
+#define CHUNKER_NATIVE_H
+
+#include <stddef.h>
+#include <stdint.h>
+
+/* Outcome for one input file. The payload lives in arenas[arena] at offset. */
+struct chunker_entry {
+    uint64_t file_size;
+    uint64_t compressed_size;
+    uint64_t offset;
+    int64_t mtime;      /* seconds since the epoch, from the same fstat */
+    uint32_t mode;
+    uint32_t crc;
+    int32_t arena;
+    int32_t stored;     /* 1: payload is the raw file bytes (ZIP_STORED) */
+    int32_t error;      /* 0, or the errno that made this file fail */
+};
+
+/* Growable output buffer owned by one worker thread. */
+struct chunker_arena {
+    char *data;
+    size_t size;
+    size_t capacity;
+};
+
+/*
+ * Compress paths[0..n_paths) with n_threads threads at the given libdeflate
+ * level. store[i] forces file i to be stored rather than deflated. Results
+ * go to entries[0..n_paths) and payloads to arenas[0..n_threads), which the
+ * caller zero-initialises and later releases with chunker_free.
+ * Returns 0, or an errno if the batch could not be run at all.
+ */
+int chunker_compress_batch(const char *const *paths, size_t n_paths,
+                           const unsigned char *store, int level, int n_threads,
+                           struct chunker_entry *entries,
+                           struct chunker_arena *arenas);
+
+void chunker_free(void *ptr);
+
+#endif
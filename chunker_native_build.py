@@ -0,0 +1,50 @@
+"""Build the optional _chunker_native extension used by zip_chunker.py.
+
+Requires cffi and the libdeflate headers/library:
+
+    python chunker_native_build.py
+"""
+from pathlib import Path
+
+from cffi import FFI
+
+HERE = Path(__file__).resolve().parent
+
+ffibuilder = FFI()
+ffibuilder.cdef("""
+    struct chunker_entry {
+        uint64_t file_size;
+        uint64_t compressed_size;
+        uint64_t offset;
+        int64_t mtime;
+        uint32_t mode;
+        uint32_t crc;
+        int32_t arena;
+        int32_t stored;
+        int32_t error;
+    };
+
+    struct chunker_arena {
+        char *data;
+        size_t size;
+        size_t capacity;
+    };
+
+    int chunker_compress_batch(const char *const *paths, size_t n_paths,
+                               const unsigned char *store, int level, int n_threads,
+                               struct chunker_entry *entries,
+                               struct chunker_arena *arenas);
+
+    void chunker_free(void *ptr);
+""")
+ffibuilder.set_source(
+    "_chunker_native",
+    '#include "chunker_native.h"',
+    sources=[str(HERE / "chunker_native.c")],
+    include_dirs=[str(HERE)],
+    libraries=["deflate", "pthread"],
+    extra_compile_args=["-O2"],
+)
+
+if __name__ == "__main__":
+    ffibuilder.compile(tmpdir=str(HERE), verbose=True)
@@ -1,14 +1,117 @@
+"""Split a folder into multiple ZIP files, each under a max size limit.
+
+Runs on the standard library alone. Optional extras, used when importable:
+
+* ``deflate`` (PyPI) -- libdeflate bindings, for faster and tighter DEFLATE.
+* ``sortedcontainers`` (PyPI) -- O(log n) bin lookups in the packer.
+* ``_chunker_native`` -- the C stage built by chunker_native_build.py.
+"""
 import os
 import re
+import mmap
 import zlib
+import shutil
 import zipfile
 import argparse
+import tempfile
+import time
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from functools import partial
+from itertools import accumulate
+from operator import add, itemgetter
 from pathlib import Path
 from datetime import datetime
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+try:
+    from sortedcontainers import SortedKeyList
+except ImportError:
+    SortedKeyList = None
+
+# libdeflate via the `deflate` package: deflate_compress() emits raw DEFLATE,
+# which is what a ZIP entry stores.
+try:
+    import deflate as libdeflate
+except ImportError:
+    libdeflate = None
+
+# Optional C compression stage, built by chunker_native_build.py.
+try:
+    from _chunker_native import ffi as native_ffi, lib as native_lib
+except ImportError:
+    native_ffi = native_lib = None
+
+def _libdeflate_round_trips():
+    # A binding that returned zlib- or gzip-wrapped output would silently
+    # corrupt every deflated entry, so prove the output is raw DEFLATE once.
+    sample = b"zip_chunker libdeflate self-check " * 64
+    try:
+        out = libdeflate.deflate_compress(sample, 6)
+        return (zlib.decompress(out, -zlib.MAX_WBITS) == sample
+                and libdeflate.crc32(sample) == zlib.crc32(sample))
+    except Exception:
+        return False
+
+if libdeflate is not None and not _libdeflate_round_trips():
+    libdeflate = None
+
+# libdeflate levels run 1-12; at 9 it is about as fast as zlib's default 6
+# while compressing better. zlib tops out at 9.
+MAX_LEVEL = 12
+MAX_ZLIB_LEVEL = 9
+COMPRESSION_LEVEL = 9 if libdeflate or native_lib else 6
+SHM_DIR = "/dev/shm"
+COPY_BUFSIZE = 1024 ** 2
+
+# Already-compressed formats gain nothing from DEFLATE, and tiny files only
+# grow; both are stored as-is.
+_INCOMPRESSIBLE = frozenset({
+    '.zip', '.gz', '.jpg', '.jpeg', '.png', '.mp4', '.mkv', '.mov',
+    '.7z', '.xz', '.zst', '.bz2', '.webp', '.woff2'
+})
+MIN_DEFLATE_SIZE = 64
+
+# Inputs this far under the limit (headers included) always fit in a single
+# part, whatever the compression does, so they skip the pool entirely.
+FAST_PATH_RATIO = 0.5
+
+# Fixed ZIP record sizes, for sizing parts exactly.
+LOCAL_HEADER_SIZE = 30
+CENTRAL_HEADER_SIZE = 46
+END_RECORD_SIZE = 22
+ZIP64_SIZES_EXTRA = 20
+ZIP64_OFFSET_EXTRA = 12
+ZIP64_END_RECORDS_SIZE = 56 + 20
+
+_SIZE_RE = re.compile(r'^([\d.]+)\s*(KB|MB|GB)?$', re.IGNORECASE)
+
+# Where an entry's compressed payload is held between compression and writing.
+STORE_FILE = 0
+STORE_SHM = 1
+
+# The native stage runs in-process and spills each batch to disk before the
+# next, so a batch bounds its resident memory; it only needs to be big enough
+# to amortise starting the threads.
+NATIVE_BATCH_BYTES = 64 * 1024 ** 2
+NATIVE_BATCH_MAX_FILES = 16384
+
+# Files are shipped to workers in batches so that small files don't pay a
+# full pickle/queue round trip each.
+BATCH_BYTES = 4 * 1024 ** 2
+BATCH_MAX_FILES = 256
+
+# Per-worker state, set once by init_worker rather than shipped with every
+# task.
+_ROOT = None
+_TEMP_FOLDER = None
+_LEVEL = COMPRESSION_LEVEL
 
 def parse_size(size_str):
-    match = re.match(r'^([\d.]+)\s*(KB|MB|GB)?$', size_str.strip(), re.IGNORECASE)
+    match = _SIZE_RE.match(size_str.strip())
     if not match:
         raise argparse.ArgumentTypeError(f"Invalid size format: '{size_str}'")
 
@@ -24,92 +127,585 @@ def parse_size(size_str):
 
     return int(size * factor)
 
-def estimate_zip_overhead(file_count, avg_name_len=50):
-    return file_count * (30 + 46 + avg_name_len) + 22
+def parse_level(level_str):
+    try:
+        level = int(level_str)
+    except ValueError:
+        level = None
+    if level is None or not 1 <= level <= MAX_LEVEL:
+        raise argparse.ArgumentTypeError(
+            f"Invalid compression level: '{level_str}' (expected 1-{MAX_LEVEL})"
+        )
+    return level
+
+def entry_overhead(zinfo):
+    """Bytes an entry adds to the archive on top of its payload.
 
-def compress_one(args):
-    file_path, root_folder = args
+    The name is stored twice, in the local header and in the central
+    directory record. Entries past the Zip64 limit carry a size extra in both.
+    """
+    overhead = LOCAL_HEADER_SIZE + CENTRAL_HEADER_SIZE + 2 * len(zinfo.filename.encode('utf-8'))
+    if max(zinfo.file_size, zinfo.compress_size) > zipfile.ZIP64_LIMIT:
+        overhead += 2 * ZIP64_SIZES_EXTRA
+    return overhead
 
+def init_worker(root_folder, temp_folder, level):
+    global _ROOT, _TEMP_FOLDER, _LEVEL
+    _ROOT = os.path.join(root_folder, '')
+    _TEMP_FOLDER = temp_folder
+    _LEVEL = level
+
+def deflate(data):
+    """Return the raw DEFLATE stream for data, as stored inside a ZIP entry."""
+    if libdeflate is not None:
+        return libdeflate.deflate_compress(data, _LEVEL)
+    compressor = zlib.compressobj(min(_LEVEL, MAX_ZLIB_LEVEL), zlib.DEFLATED, -zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+def crc32(data):
+    if libdeflate is not None:
+        return libdeflate.crc32(data)
+    return zlib.crc32(data)
+
+def zipinfo_from_stat(arcname, mtime, mode):
+    """ZipInfo.from_file, minus its own stat() of a file we already fstat'ed."""
+    info = zipfile.ZipInfo(arcname, time.localtime(mtime)[0:6])
+    info.external_attr = (mode & 0xFFFF) << 16
+    return info
+
+def compress_one(file_path):
+    # Map anything bigger than a page instead of reading it: the compressor
+    # and crc32 take any buffer, so this saves a full copy of the file.
     with open(file_path, 'rb') as f:
-        data = f.read()
+        st = os.fstat(f.fileno())
+        if st.st_size < mmap.PAGESIZE:
+            return compress_data(file_path, st, f.read())
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return compress_data(file_path, st, mm)
+
+def compress_data(file_path, st, data):
+    arcname = file_path[len(_ROOT):]
+    info = zipinfo_from_stat(arcname, st.st_mtime, st.st_mode)
+    info.file_size = len(data)
+    info.CRC = crc32(data)
+
+    compressed = None
+    if (len(data) >= MIN_DEFLATE_SIZE
+            and os.path.splitext(file_path)[1].lower() not in _INCOMPRESSIBLE):
+        compressed = deflate(data)
+    if compressed is None or len(compressed) >= len(data):
+        info.compress_type = zipfile.ZIP_STORED
+        compressed = bytes(data)  # data may be a mapping that is about to close
+    else:
+        info.compress_type = zipfile.ZIP_DEFLATED
+    info.compress_size = len(compressed)
+
+    return (file_path, info, entry_overhead(info)), compressed
+
+def compress_batch(paths):
+    entries, payloads, errors = [], [], []
+    for path in paths:
+        try:
+            entry, payload = compress_one(path)
+        except Exception as e:
+            errors.append((path, e))
+            continue
+        entries.append(entry)
+        payloads.append(payload)
+    if not entries:
+        return [], errors
+
+    store, handle, offsets = stash_payloads(payloads, _TEMP_FOLDER)
+    results = [(*entry, store, handle, offset) for entry, offset in zip(entries, offsets)]
+    return results, errors
+
+def native_compress_batch(paths, root_prefix, level, thread_count, temp_folder):
+    """compress_batch on the C extension's threads, in this process.
+
+    The per-thread arenas are written out to one temp file and freed before
+    returning, so entries come back as (STORE_FILE, path, offset) like the
+    pool's spill path and memory never holds more than one batch.
+    """
+    c_paths = [native_ffi.new("char[]", os.fsencode(p)) for p in paths]
+    path_array = native_ffi.new("char *[]", c_paths)
+    store = native_ffi.new("unsigned char[]", [
+        os.path.splitext(p)[1].lower() in _INCOMPRESSIBLE for p in paths
+    ])
+    entries = native_ffi.new("struct chunker_entry[]", len(paths))
+    arenas = native_ffi.new("struct chunker_arena[]", thread_count)
+
+    arena_offsets = []
+    try:
+        err = native_lib.chunker_compress_batch(
+            path_array, len(paths), store, level, thread_count, entries, arenas
+        )
+        if err:
+            raise OSError(err, os.strerror(err))
+
+        with tempfile.NamedTemporaryFile(dir=temp_folder, delete=False) as tmpf:
+            for t in range(thread_count):
+                arena_offsets.append(tmpf.tell())
+                if arenas[t].data != native_ffi.NULL:
+                    tmpf.write(native_ffi.buffer(arenas[t].data, arenas[t].size))
+    finally:
+        for t in range(thread_count):
+            if arenas[t].data != native_ffi.NULL:
+                native_lib.chunker_free(arenas[t].data)
+                arenas[t].data = native_ffi.NULL
+
+    results, errors = [], []
+    for path, entry in zip(paths, entries):
+        if entry.error:
+            errors.append((path, OSError(entry.error, os.strerror(entry.error), path)))
+            continue
+        try:
+            info = zipinfo_from_stat(path[len(root_prefix):], entry.mtime, entry.mode)
+        except ValueError as e:
+            errors.append((path, e))
+            continue
+        info.compress_type = zipfile.ZIP_STORED if entry.stored else zipfile.ZIP_DEFLATED
+        info.file_size = entry.file_size
+        info.compress_size = entry.compressed_size
+        info.CRC = entry.crc
+        offset = arena_offsets[entry.arena] + entry.offset
+        results.append((path, info, entry_overhead(info), STORE_FILE, tmpf.name, offset))
+    if not results:
+        os.remove(tmpf.name)
+    return results, errors
+
+def verify_part(zip_path):
+    with zipfile.ZipFile(zip_path) as zf:
+        return zip_path, zf.testzip()
+
+def sort_by_size(sized_paths):
+    """Return (size, path) pairs, largest first.
+
+    Handing out the biggest files first keeps one late large file from
+    straggling while the other workers sit idle.
+    """
+    return sorted(sized_paths, reverse=True)
+
+def batch_files(sized_paths, target_bytes=BATCH_BYTES, max_files=BATCH_MAX_FILES):
+    # Fed largest-first, this yields batches of similar weight in descending
+    # order: big files travel alone, small ones are grouped up to the target.
+    batch, batch_bytes = [], 0
+    for size, path in sized_paths:
+        batch.append(path)
+        batch_bytes += size
+        if batch_bytes >= target_bytes or len(batch) >= max_files:
+            yield batch
+            batch, batch_bytes = [], 0
+    if batch:
+        yield batch
+
+def shm_has_room(size):
+    # POSIX shared memory lives in a tmpfs on Linux; overcommitting it turns
+    # into SIGBUS on write instead of an exception, so check before creating.
+    # tmpfs hands out whole pages.
+    if not os.path.isdir(SHM_DIR):
+        return True
+    pages = -(-max(size, 1) // mmap.PAGESIZE)
+    return shutil.disk_usage(SHM_DIR).free > 2 * pages * mmap.PAGESIZE
+
+def stash_payloads(payloads, temp_folder):
+    """Hand a batch's compressed bytes to the parent in one shared block.
+
+    One segment per batch (or one temp file, when shared memory is short)
+    rather than one per file: a segment costs at least a page plus several
+    syscalls. Returns (store, handle, offsets), where handle is the segment
+    name or file path and offsets locate each payload inside it.
+    """
+    total = sum(map(len, payloads))
+    offsets = list(accumulate(map(len, payloads), initial=0))[:-1]
+
+    if shm_has_room(total):
+        try:
+            shm = SharedMemory(create=True, size=max(total, 1))
+        except OSError:
+            pass
+        else:
+            for payload, offset in zip(payloads, offsets):
+                shm.buf[offset:offset + len(payload)] = payload
+            shm.close()
+            return STORE_SHM, shm.name, offsets
+
+    with tempfile.NamedTemporaryFile(dir=temp_folder, delete=False) as tmpf:
+        for payload in payloads:
+            tmpf.write(payload)
+    return STORE_FILE, tmpf.name, offsets
+
+def copy_payload(src, dst, size):
+    """Copy size bytes from src's position to dst, via os.sendfile if possible."""
+    base = src.tell()
+    copied = 0
+    try:
+        src_fd, dst_fd = src.fileno(), dst.fileno()
+    except (AttributeError, OSError):
+        src_fd = dst_fd = None
+
+    if src_fd is not None and hasattr(os, 'sendfile'):
+        start = dst.tell()
+        dst.flush()
+        try:
+            while copied < size:
+                sent = os.sendfile(dst_fd, src_fd, base + copied, size - copied)
+                if not sent:
+                    break
+                copied += sent
+        except OSError:
+            pass
+        # sendfile moved the fd behind the buffered writer's back.
+        dst.seek(start + copied)
+        src.seek(base + copied)
+
+    while copied < size:
+        chunk = src.read(min(COPY_BUFSIZE, size - copied))
+        if not chunk:
+            break
+        dst.write(chunk)
+        copied += len(chunk)
 
-    compressed = zlib.compress(data, level=6)
-    compressed_size = len(compressed)
-    arcname = os.path.relpath(file_path, root_folder)
+def write_precompressed(zipf, zinfo, data):
+    """Append an entry whose payload is already compressed to an open ZipFile.
 
-    return {
-        'path': str(file_path),
-        'arcname': arcname,
-        'size': compressed_size
-    }
+    This is ZipFile.writestr without the compressor: CRC and sizes are known
+    up front, so the local header is written once and never patched. data is
+    either a bytes-like object or a binary file positioned at the payload.
+    """
+    zipf._writecheck(zinfo)
+    # Sizes are final, so Zip64 extras go only on entries that need them.
+    zip64 = max(zinfo.file_size, zinfo.compress_size) > zipfile.ZIP64_LIMIT
+    if zip64 and not zipf._allowZip64:
+        raise zipfile.LargeZipFile("Entry size would require ZIP64 extensions")
+    zinfo.header_offset = zipf.fp.tell()
+    zipf.fp.write(zinfo.FileHeader(zip64))
+    if hasattr(data, 'read'):
+        copy_payload(data, zipf.fp, zinfo.compress_size)
+    else:
+        zipf.fp.write(data)
+    zipf.filelist.append(zinfo)
+    zipf.NameToInfo[zinfo.filename] = zinfo
+    zipf.start_dir = zipf.fp.tell()
+
+class BisectKeyList:
+    """The slice of sortedcontainers.SortedKeyList the packer uses, on bisect.
+
+    Inserts are O(n) list shifts rather than O(log n), which only matters
+    with very many open bins.
+    """
+    def __init__(self, key):
+        self.key = key
+        self.keys = []
+        self.items = []
+
+    def __len__(self):
+        return len(self.items)
+
+    def bisect_key_left(self, key):
+        return bisect_left(self.keys, key)
+
+    def pop(self, idx):
+        del self.keys[idx]
+        return self.items.pop(idx)
+
+    def add(self, item):
+        key = self.key(item)
+        idx = bisect_right(self.keys, key)
+        self.keys.insert(idx, key)
+        self.items.insert(idx, item)
+
+if SortedKeyList is None:
+    SortedKeyList = BisectKeyList
+
+class CompressedFiles:
+    """Compression results kept as parallel arrays, addressed by index.
+
+    The packer only ever looks at sizes and overheads, so those live in flat
+    C arrays rather than in one dict per file.
+    """
+    def __init__(self):
+        self.paths = []
+        self.sizes = array('Q')
+        self.overheads = array('Q')
+        self.zipinfos = []
+        self.stores = bytearray()
+        self.handles = []
+        self.offsets = array('Q')
+
+    def __len__(self):
+        return len(self.paths)
+
+    def append(self, result):
+        path, info, overhead, store, handle, offset = result
+        self.paths.append(path)
+        self.sizes.append(info.compress_size)
+        self.overheads.append(overhead)
+        self.zipinfos.append(info)
+        self.stores.append(store)
+        self.handles.append(handle)
+        self.offsets.append(offset)
 
 class ZipChunker:
-    def __init__(self, folder_to_zip, output_folder, max_chunk_size_bytes):
+    def __init__(self, folder_to_zip, output_folder, max_chunk_size_bytes,
+                 level=COMPRESSION_LEVEL):
         self.folder = Path(folder_to_zip).resolve()
         self.output_folder = Path(output_folder).resolve()
         self.max_chunk_size = max_chunk_size_bytes
+        self.level = level
         self.base_name = self.folder.name
+        self.temp_folder = None
+        self.shm_names = set()
+        # Batch payload blocks are shared by several entries, possibly in
+        # different parts; each is released once its last entry is written.
+        self.payload_refs = {}
+        self.open_shms = {}
+        self.payload_lock = threading.Lock()
 
     def __enter__(self):
         self.output_folder.mkdir(parents=True, exist_ok=True)
+        self.temp_folder = tempfile.mkdtemp(prefix=f"{self.base_name}_")
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        pass  # no cleanup needed anymore
+        if self.temp_folder:
+            shutil.rmtree(self.temp_folder, ignore_errors=True)
+            self.temp_folder = None
+
+        for shm in self.open_shms.values():
+            shm.close()
+        self.open_shms.clear()
+        self.payload_refs.clear()
+
+        for name in self.shm_names:
+            try:
+                shm = SharedMemory(name=name)
+            except FileNotFoundError:
+                continue
+            shm.close()
+            shm.unlink()
+        self.shm_names.clear()
 
     def walk_files(self):
-        for path in self.folder.rglob("*"):
-            if path.is_file():
-                yield path
-
-    def compress_to_estimate_parallel(self, process_count):
-        files = list(self.walk_files())
-        print(f"🧠 Using {process_count} processes for compression estimation...")
-
-        results = []
-        with ProcessPoolExecutor(max_workers=process_count) as executor:
-            future_to_path = {
-                executor.submit(compress_one, (p, str(self.folder))): p
-                for p in files
-            }
-            for future in as_completed(future_to_path):
+        """Yield (size, path) for every file under the folder.
+
+        scandir hands back the file type from the directory listing itself,
+        so the only stat() per file is the one for its size, which the
+        scheduler needs anyway. No Path objects are created.
+        """
+        stack = [str(self.folder)]
+        while stack:
+            folder = stack.pop()
+            try:
+                with os.scandir(folder) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file():
+                            try:
+                                size = entry.stat().st_size
+                            except OSError:
+                                size = 0  # compress_one will report it
+                            yield size, entry.path
+            except OSError as e:
+                print(f"❌ Error reading {folder}: {e}")
+
+    def worker_pool(self, process_count):
+        # Start the tracker before forking so every worker shares it; otherwise
+        # each worker gets its own and unlinks its segments when it exits.
+        resource_tracker.ensure_running()
+        return ProcessPoolExecutor(
+            max_workers=process_count,
+            initializer=init_worker,
+            initargs=(str(self.folder), self.temp_folder, self.level)
+        )
+
+    def fits_in_one_part(self, sized_paths):
+        prefix_len = len(os.path.join(str(self.folder), ''))
+        total = END_RECORD_SIZE
+        for size, path in sized_paths:
+            name_len = len(path[prefix_len:].encode('utf-8'))
+            total += size + LOCAL_HEADER_SIZE + CENTRAL_HEADER_SIZE + 2 * name_len
+        if len(sized_paths) > zipfile.ZIP_FILECOUNT_LIMIT:
+            total += ZIP64_END_RECORDS_SIZE
+        return total <= self.max_chunk_size * FAST_PATH_RATIO
+
+    def write_single(self, sized_paths):
+        """Zip everything into one part in-process, with no pool or temp storage.
+
+        Runs the workers' own compress_one here, so the compressor, level and
+        store-if-larger rule are the same as on the parallel path.
+        """
+        init_worker(str(self.folder), self.temp_folder, self.level)
+        zip_path = self.output_folder / f"{self.base_name}_part1.zip"
+        with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED,
+                             allowZip64=True) as zipf:
+            for size, path in sized_paths:
                 try:
-                    result = future.result()
-                    results.append(result)
+                    (_, info, _), payload = compress_one(path)
                 except Exception as e:
-                    print(f"❌ Error estimating {future_to_path[future]}: {e}")
+                    print(f"❌ Error compressing {path}: {e}")
+                    continue
+                write_precompressed(zipf, info, payload)
+
+        real_size = zip_path.stat().st_size
+        print(f"✅ Created: {zip_path} ({real_size // 1024} KB)")
+        return zip_path
+
+    def compress_to_temp_parallel(self, executor, process_count, sized_paths):
+        print(f"🧠 Using {process_count} processes for compression...")
+
+        files = CompressedFiles()
+        batches = list(batch_files(sized_paths))
+        # A few queue items per worker: fewer round trips on huge trees,
+        # still enough granularity to balance the tail.
+        chunksize = max(1, len(batches) // (process_count * 4))
+        for results, errors in executor.map(compress_batch, batches, chunksize=chunksize):
+            for path, e in errors:
+                print(f"❌ Error compressing {path}: {e}")
+            for result in results:
+                files.append(result)
+                handle = files.handles[-1]
+                self.payload_refs[handle] = self.payload_refs.get(handle, 0) + 1
+                if files.stores[-1] == STORE_SHM:
+                    self.shm_names.add(handle)
 
-        return results
+        return files
+
+    def compress_native(self, thread_count, sized_paths):
+        print(f"🧠 Using {thread_count} native threads for compression...")
+
+        files = CompressedFiles()
+        root_prefix = os.path.join(str(self.folder), '')
+        batches = batch_files(sized_paths, NATIVE_BATCH_BYTES, NATIVE_BATCH_MAX_FILES)
+        for batch in batches:
+            results, errors = native_compress_batch(
+                batch, root_prefix, self.level, thread_count, self.temp_folder
+            )
+            for path, e in errors:
+                print(f"❌ Error compressing {path}: {e}")
+            for result in results:
+                files.append(result)
+                handle = files.handles[-1]
+                self.payload_refs[handle] = self.payload_refs.get(handle, 0) + 1
+
+        return files
 
     def bin_pack_files(self, files):
+        # Best-fit decreasing on exact sizes: each file needs its payload plus
+        # its own headers, and every part pays for one end record. Bins hold
+        # indices into files.
+        if not len(files):
+            return []
+        sizes, overheads = files.sizes, files.overheads
+        order = sorted(range(len(files)), key=sizes.__getitem__, reverse=True)
+
+        capacity = self.max_chunk_size - END_RECORD_SIZE
+        per_file = 0
+        zip64_end = self.max_chunk_size > zipfile.ZIP64_LIMIT
+        if zip64_end:
+            # Entries starting past ZIP64_LIMIT (2 GiB - 1) into a part need a
+            # Zip64 header offset, and the part itself Zip64 end records.
+            capacity -= ZIP64_END_RECORDS_SIZE
+            per_file = ZIP64_OFFSET_EXTRA
+        min_need = min(map(add, sizes, overheads)) + per_file
+
         bins = []
-        for file in sorted(files, key=lambda x: x['size'], reverse=True):
-            placed = False
-            for b in bins:
-                estimated_overhead = estimate_zip_overhead(len(b['files']) + 1)
-                if b['size'] + file['size'] + estimated_overhead <= self.max_chunk_size:
-                    b['files'].append(file)
-                    b['size'] += file['size']
-                    placed = True
-                    break
-            if not placed:
-                bins.append({'files': [file], 'size': file['size']})
+        open_bins = SortedKeyList(key=itemgetter('remaining'))
+        for i in order:
+            need = sizes[i] + overheads[i] + per_file
+            idx = open_bins.bisect_key_left(need)
+            if idx < len(open_bins):
+                b = open_bins.pop(idx)
+                b['files'].append(i)
+                b['size'] += sizes[i]
+                b['remaining'] -= need
+            else:
+                b = {'files': [i], 'size': sizes[i], 'remaining': capacity - need}
+                bins.append(b)
+            if not zip64_end and len(b['files']) == zipfile.ZIP_FILECOUNT_LIMIT:
+                # One more entry and the part needs Zip64 end records; reserve
+                # them now so the fit test stays a plain key comparison.
+                b['remaining'] -= ZIP64_END_RECORDS_SIZE
+            # Bins that can't take even the smallest file are closed for good.
+            if b['remaining'] >= min_need:
+                open_bins.add(b)
         return bins
 
-    def write_bins(self, bins):
-        for i, b in enumerate(bins, 1):
-            if not b['files']:
-                continue
+    def write_bins(self, files, bins):
+        # Parts are independent files and the copies release the GIL, so the
+        # writers can run side by side.
+        numbered = [(i, b) for i, b in enumerate(bins, 1) if b['files']]
+        if not numbered:
+            return []
+        with ThreadPoolExecutor(max_workers=min(len(numbered), os.cpu_count() or 1)) as tp:
+            return list(tp.map(partial(self.write_one_bin, files), numbered))
+
+    def write_one_bin(self, files, numbered_bin):
+        i, b = numbered_bin
+        zip_path = self.output_folder / f"{self.base_name}_part{i}.zip"
+        with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED,
+                             allowZip64=True) as zipf:
+            for idx in b['files']:
+                self.splice_entry(zipf, files, idx)
+
+        real_size = zip_path.stat().st_size
+        print(f"✅ Created: {zip_path} ({real_size // 1024} KB)")
+        return zip_path
+
+    def splice_entry(self, zipf, files, i):
+        """Copy one entry's compressed payload into zipf and release it.
+
+        This is the only place compressed bytes are consumed: whatever the
+        workers produced goes into the part verbatim, nothing is re-read
+        from the source tree or deflated again.
+        """
+        zinfo, handle, offset = files.zipinfos[i], files.handles[i], files.offsets[i]
+        if files.stores[i] == STORE_FILE:
+            with open(handle, 'rb') as tmpf:
+                tmpf.seek(offset)
+                write_precompressed(zipf, zinfo, tmpf)
+            self.release_payload(handle, STORE_FILE)
+            return
 
-            zip_path = self.output_folder / f"{self.base_name}_part{i}.zip"
-            with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED) as zipf:
-                for f in b['files']:
-                    zipf.write(f['path'], arcname=f['arcname'])
+        shm = self.attach_shm(handle)
+        with shm.buf[offset:offset + zinfo.compress_size] as data:
+            write_precompressed(zipf, zinfo, data)
+        self.release_payload(handle, STORE_SHM)
 
-            real_size = zip_path.stat().st_size
-            print(f"✅ Created: {zip_path} ({real_size // 1024} KB)")
+    def attach_shm(self, name):
+        with self.payload_lock:
+            shm = self.open_shms.get(name)
+            if shm is None:
+                shm = self.open_shms[name] = SharedMemory(name=name)
+            return shm
 
-    def run(self, process_count=4):
+    def release_payload(self, handle, store):
+        with self.payload_lock:
+            self.payload_refs[handle] -= 1
+            if self.payload_refs[handle]:
+                return
+            del self.payload_refs[handle]
+            shm = self.open_shms.pop(handle, None)
+
+        if store == STORE_FILE:
+            os.remove(handle)
+            return
+        if shm is None:
+            shm = SharedMemory(name=handle)
+        shm.close()
+        shm.unlink()
+        self.shm_names.discard(handle)
+
+    def verify_parts(self, zip_paths, executor=None):
+        mapper = executor.map if executor else map
+        ok = True
+        for zip_path, bad_entry in mapper(verify_part, map(str, zip_paths)):
+            if bad_entry is not None:
+                print(f"❌ CRC mismatch in {zip_path}: {bad_entry}")
+                ok = False
+        return ok
+
+    def run(self, process_count=4, verify=False):
         print(f"📁 Zipping: {self.folder}")
         print(f"📦 Output: {self.output_folder}")
         print(f"🎯 Max ZIP size: {self.max_chunk_size / (1024 * 1024):.2f} MB")
@@ -117,14 +713,40 @@ class ZipChunker:
         if self.max_chunk_size < 1024:
             print("⚠️ Warning: Chunk size is very small — zip overhead may exceed your limit.")
 
-        print("🔄 Estimating compressed sizes...")
-        all_files = self.compress_to_estimate_parallel(process_count)
+        if libdeflate is None and native_lib is None and self.level > MAX_ZLIB_LEVEL:
+            print(f"⚠️ Warning: libdeflate not installed — using zlib level {MAX_ZLIB_LEVEL}.")
+
+        sized_paths = sort_by_size(self.walk_files())
+        # The native stage never starts the pool, so it gains nothing here.
+        if native_lib is None and sized_paths and self.fits_in_one_part(sized_paths):
+            print("🗜 Everything fits in one ZIP — writing it directly...")
+            zip_path = self.write_single(sized_paths)
+            if verify:
+                print("🔍 Verifying ZIP files...")
+                if self.verify_parts([zip_path]):
+                    print("✅ All parts verified.")
+            print("🎉 Done — 1 ZIP file(s) created.")
+            return
+
+        # One pool for the whole run, so workers start (and build their
+        # compressors) once and stay warm for the verification pass.
+        with self.worker_pool(process_count) as executor:
+            print("🔄 Compressing files...")
+            if native_lib is not None:
+                all_files = self.compress_native(process_count, sized_paths)
+            else:
+                all_files = self.compress_to_temp_parallel(executor, process_count, sized_paths)
 
-        print("📐 Bin packing...")
-        bins = self.bin_pack_files(all_files)
+            print("📐 Bin packing...")
+            bins = self.bin_pack_files(all_files)
 
-        print("🗜 Writing ZIP files...")
-        self.write_bins(bins)
+            print("🗜 Writing ZIP files...")
+            zip_paths = self.write_bins(all_files, bins)
+
+            if verify:
+                print("🔍 Verifying ZIP files...")
+                if self.verify_parts(zip_paths, executor):
+                    print("✅ All parts verified.")
 
         print(f"🎉 Done — {len(bins)} ZIP file(s) created.")
 
@@ -142,9 +764,22 @@ def parse_args():
         "-p", "--processes", type=int, default=os.cpu_count(),
         help="Number of processes to use (default: CPU count)"
     )
+    parser.add_argument(
+        "-l", "--level", type=parse_level, default=COMPRESSION_LEVEL,
+        help=(
+            f"Compression level 1-{MAX_LEVEL} (default: {COMPRESSION_LEVEL}). With libdeflate: "
+            "6 ~ zlib's default, 9 ~ zlib 6 speed with smaller output, "
+            "12 = optimal parsing, smallest output but ~20x slower. "
+            f"Without libdeflate, levels above {MAX_ZLIB_LEVEL} act as {MAX_ZLIB_LEVEL}."
+        )
+    )
+    parser.add_argument(
+        "--verify", action="store_true",
+        help="Re-read every part after writing and check all CRCs"
+    )
     return parser.parse_args()
 
 if __name__ == "__main__":
     args = parse_args()
-    with ZipChunker(args.folder, args.output, args.size) as chunker:
-        chunker.run(process_count=args.processes)
+    with ZipChunker(args.folder, args.output, args.size, level=args.level) as chunker:
+        chunker.run(process_count=args.processes, verify=args.verify)